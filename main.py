@@ -1,22 +1,126 @@
 #!/usr/bin/env python3
 """Task Tracker CLI - Main entry point."""
-import click
-from rich.console import Console
-from rich.table import Table
-from rich.panel import Panel
-from rich.text import Text
-from rich import box
+import sys
 
-from task_manager import TaskManager
-from storage import TaskStorage
+from task_manager import get_manager
+from storage import TaskStorage, WriteError
 
 
-console = Console()
+VERSION = "1.0.0"
+PROG_NAME = "task-tracker"
+PRIORITY_CHOICES = ("high", "medium", "low")
+STATUS_CHOICES = ("completed", "pending", "all")
 
+# Command name -> (handler, usage) registry filled in by @command
+_COMMANDS = {}
 
-def get_manager():
-    """Get TaskManager instance."""
-    return TaskManager()
+
+class UsageError(Exception):
+    """Raised when command-line arguments cannot be parsed."""
+
+    def __init__(self, message: str, command: str = None):
+        super().__init__(message)
+        self.command = command
+
+
+def command(name: str, usage: str = ""):
+    """Register a function as a CLI command handler."""
+    def register(func):
+        _COMMANDS[name] = (func, usage)
+        return func
+    return register
+
+
+def parse_args(name: str, argv, positional=(), options=None, flags=None, rest=None):
+    """Parse command arguments without pulling in an argument framework.
+
+    ``options`` maps each flag spelling (``-p``, ``--priority``) to the
+    keyword it fills, ``flags`` does the same for boolean switches.
+    As with Click, long options take ``--name=value`` and short options
+    take an attached value (``-phigh``).
+    If ``rest`` is given, positionals beyond ``positional`` are collected
+    into a list under that key instead of being rejected.
+    Returns a dict with one entry per positional name, option and flag.
+    """
+    options = options or {}
+    flags = flags or {}
+    values = {key: None for key in options.values()}
+    values.update({key: False for key in flags.values()})
+    args = []
+
+    tokens = iter(argv)
+    for token in tokens:
+        if token == "--":
+            args.extend(tokens)
+            break
+        if token.startswith("--"):
+            flag, eq, inline = token.partition("=")
+            attached = bool(eq)
+        else:
+            flag, inline = token[:2], token[2:]
+            attached = bool(inline)
+        if flag in options and token.startswith("-"):
+            if attached:
+                values[options[flag]] = inline
+            else:
+                try:
+                    values[options[flag]] = next(tokens)
+                except StopIteration:
+                    raise UsageError(f"Option '{flag}' requires an argument.", name)
+        elif token in flags:
+            values[flags[token]] = True
+        elif token.startswith("-") and token != "-":
+            raise UsageError(f"No such option: {token}", name)
+        else:
+            args.append(token)
+
+    if len(args) < len(positional):
+        missing = positional[len(args)].upper()
+        raise UsageError(f"Missing argument '{missing}'.", name)
+    if rest is not None:
+        values[rest] = args[len(positional):]
+        args = args[:len(positional)]
+    elif len(args) > len(positional):
+        raise UsageError(f"Got unexpected extra argument ({args[len(positional)]})", name)
+
+    values.update(zip(positional, args))
+    return values
+
+
+def choice(name: str, option: str, value: str, choices, case_sensitive: bool = True):
+    """Validate ``value`` against ``choices``; ``None`` passes through."""
+    if value is None:
+        return None
+    for candidate in choices:
+        if value == candidate or (not case_sensitive and value.lower() == candidate):
+            return candidate
+    raise UsageError(
+        f"Invalid value for '{option}': '{value}' is not one of "
+        + ", ".join(f"'{c}'" for c in choices) + ".",
+        name,
+    )
+
+
+def task_id_arg(name: str, value: str) -> int:
+    """Convert a TASK_ID argument to int."""
+    try:
+        return int(value)
+    except ValueError:
+        raise UsageError(f"Invalid value for 'TASK_ID': '{value}' is not a valid integer.", name)
+
+
+def confirm(prompt: str, assume_yes: bool) -> None:
+    """Ask for confirmation, exiting with status 1 unless the user agrees."""
+    if assume_yes:
+        return
+    try:
+        answer = input(f"{prompt} [y/N]: ")
+    except (EOFError, KeyboardInterrupt):
+        answer = ""
+        print()
+    if answer.strip().lower() not in ("y", "yes"):
+        print("Aborted!", file=sys.stderr)
+        sys.exit(1)
 
 
 def priority_color(priority: str) -> str:
@@ -28,167 +132,279 @@ def priority_color(priority: str) -> str:
     }.get(priority, "white")
 
 
+def priority_markup(priority: str) -> str:
+    """Get the rich markup for a priority label, e.g. ``[red]HIGH[/red]``."""
+    color = priority_color(priority)
+    return f"[{color}]{priority.upper()}[/{color}]"
+
+
+# Priority labels are rendered on every list row, so build them once
+_PRI_MARKUP = {p: priority_markup(p) for p in PRIORITY_CHOICES}
+
+
+_ANSI_CODES = {"green": 32, "red": 31, "yellow": 33, "cyan": 36}
+
+
+def _ansi(color: str, message: str) -> str:
+    """Wrap ``message`` in an ANSI colour code when stdout is a terminal."""
+    if not sys.stdout.isatty():
+        return message
+    return f"\x1b[{_ANSI_CODES[color]}m{message}\x1b[0m"
+
+
 def status_symbol(completed: bool) -> str:
     """Get status symbol."""
     return "✅" if completed else "⏳"
 
 
-@click.group()
-@click.version_option(version="1.0.0", prog_name="task-tracker")
-def cli():
+def cli(argv=None):
     """📝 Task Tracker - Command-line task management made simple."""
-    pass
+    argv = sys.argv[1:] if argv is None else argv
+    name = argv[0] if argv else "--help"
+
+    if name in ("--help", "-h", "help"):
+        print_help()
+        return
+    if name == "--version":
+        print(f"{PROG_NAME}, version {VERSION}")
+        return
+    if name not in _COMMANDS:
+        print_usage_error(UsageError(f"No such command '{name}'."))
+        sys.exit(2)
+
+    handler, usage = _COMMANDS[name]
+    if "--help" in argv[1:] or "-h" in argv[1:]:
+        print(f"Usage: tt {name} {usage}".rstrip())
+        print()
+        print(f"  {handler.__doc__}")
+        return
+
+    try:
+        handler(argv[1:])
+    except UsageError as e:
+        print_usage_error(e)
+        sys.exit(2)
+    except WriteError as e:
+        # A queued write failed; see the flush() calls in the commands
+        print(f"Error: could not save tasks: {e}", file=sys.stderr)
+        sys.exit(1)
+
 
+def print_help() -> None:
+    """Print the top-level command overview."""
+    print("Usage: tt [--version] [--help] COMMAND [ARGS]...")
+    print()
+    print(f"  {cli.__doc__}")
+    print()
+    print("Commands:")
+    width = max(len(name) for name in _COMMANDS)
+    for name, (handler, _) in _COMMANDS.items():
+        print(f"  {name.ljust(width)}  {handler.__doc__}")
 
-@cli.command()
-@click.argument("title")
-@click.option("--priority", "-p", default="medium", 
-              type=click.Choice(["high", "medium", "low"], case_sensitive=False),
-              help="Task priority level")
-@click.option("--description", "-d", default="", help="Optional task description")
-def add(title, priority, description):
+
+def print_usage_error(error: UsageError) -> None:
+    """Print a usage error the way the CLI has always reported them."""
+    if error.command:
+        usage = _COMMANDS[error.command][1]
+        print(f"Usage: tt {error.command} {usage}".rstrip(), file=sys.stderr)
+        print(f"Try 'tt {error.command} --help' for help.", file=sys.stderr)
+    else:
+        print("Usage: tt [--version] [--help] COMMAND [ARGS]...", file=sys.stderr)
+        print("Try 'tt --help' for help.", file=sys.stderr)
+    print(file=sys.stderr)
+    print(f"Error: {error}", file=sys.stderr)
+
+
+@command("add", "TITLE [-p high|medium|low] [-d DESCRIPTION]")
+def _add(argv):
     """Add a new task."""
+    args = parse_args("add", argv, positional=("title",), options={
+        "-p": "priority", "--priority": "priority",
+        "-d": "description", "--description": "description",
+    })
+    priority = choice("add", "--priority", args["priority"] or "medium",
+                      PRIORITY_CHOICES, case_sensitive=False)
+    description = args["description"] or ""
+
     manager = get_manager()
-    task = manager.add_task(title, priority, description)
-    
+    task = manager.add_task(args["title"], priority, description)
+    manager.storage.flush()
+
+    from rich.console import Console
+    from rich.panel import Panel
+    console = Console()
     console.print(Panel(
         f"[bold green]Task added successfully![/bold green]\n\n"
-        f"ID: {task['id']}\n"
-        f"Title: {task['title']}\n"
-        f"Priority: [{priority_color(priority)}]{priority.upper()}[/{priority_color(priority)}]",
+        f"ID: {task.id}\n"
+        f"Title: {task.title}\n"
+        f"Priority: {_PRI_MARKUP[priority]}",
         title="📝 New Task",
         border_style="green"
     ))
 
 
-@cli.command()
-@click.option("--status", "-s", 
-              type=click.Choice(["completed", "pending", "all"]),
-              default="all", help="Filter by status")
-@click.option("--priority", "-p",
-              type=click.Choice(["high", "medium", "low"]),
-              help="Filter by priority")
-def list(status, priority):
+@command("list", "[-s completed|pending|all] [-p high|medium|low]")
+def _list(argv):
     """List all tasks with optional filtering."""
+    args = parse_args("list", argv, options={
+        "-s": "status", "--status": "status",
+        "-p": "priority", "--priority": "priority",
+    })
+    status = choice("list", "--status", args["status"] or "all", STATUS_CHOICES)
+    priority = choice("list", "--priority", args["priority"], PRIORITY_CHOICES)
+
     manager = get_manager()
-    
+
     # Map 'all' to None for no filtering
     status_filter = status if status != "all" else None
     tasks = manager.list_tasks(status=status_filter, priority=priority)
-    
+
+    from rich.console import Console
+    console = Console()
     if not tasks:
         console.print("[dim]No tasks found.[/dim]")
         return
-    
+
+    from rich.table import Table
+    from rich import box
     table = Table(
         title="📝 Your Tasks",
         box=box.ROUNDED,
         show_header=True,
         header_style="bold cyan"
     )
-    
+
     table.add_column("ID", style="dim", width=4)
     table.add_column("Status", width=6, justify="center")
     table.add_column("Priority", width=10)
     table.add_column("Title", min_width=20)
     table.add_column("Description", style="dim", max_width=30)
-    
+
+    markup = _PRI_MARKUP
     for task in tasks:
-        status_emoji = status_symbol(task.get("completed", False))
-        priority = task.get("priority", "medium")
-        title_text = task.get("title", "")
-        
+        status_emoji = status_symbol(task.completed)
+        priority = task.priority
+        title_text = task.title
+
         # Strikethrough for completed tasks
-        if task.get("completed"):
+        if task.completed:
             title_text = f"[strike]{title_text}[/strike]"
-        
+
         table.add_row(
-            str(task["id"]),
+            str(task.id),
             status_emoji,
-            f"[{priority_color(priority)}]{priority.upper()}[/{priority_color(priority)}]",
+            markup.get(priority) or priority_markup(priority),
             title_text,
-            task.get("description", "")[:50]
+            (task.description or "")[:50]
         )
-    
+
     console.print(table)
     console.print(f"\n[dim]Showing {len(tasks)} task(s)[/dim]")
 
 
-@cli.command()
-@click.argument("task_id", type=int)
-def complete(task_id):
+@command("complete", "TASK_ID")
+def _complete(argv):
     """Mark a task as completed."""
+    args = parse_args("complete", argv, positional=("task_id",))
+    task_id = task_id_arg("complete", args["task_id"])
+
     manager = get_manager()
     task = manager.complete_task(task_id)
-    
+    # Writes are asynchronous; make sure this one landed before reporting it
+    manager.storage.flush()
+
     if task:
-        console.print(f"[green]✅ Task #{task_id} marked as completed![/green]")
+        print(_ansi("green", f"✅ Task #{task_id} marked as completed!"))
     else:
-        console.print(f"[red]❌ Task #{task_id} not found.[/red]")
+        print(_ansi("red", f"❌ Task #{task_id} not found."))
+
+
+@command("batch-complete", "TASK_ID...")
+def _batch_complete(argv):
+    """Mark several tasks as completed with a single write."""
+    args = parse_args("batch-complete", argv, rest="task_ids")
+    if not args["task_ids"]:
+        raise UsageError("Missing argument 'TASK_ID...'.", "batch-complete")
+    task_ids = [task_id_arg("batch-complete", value) for value in args["task_ids"]]
+
+    manager = get_manager()
+    with manager.batch():
+        found = [manager.complete_task(task_id) is not None for task_id in task_ids]
+    manager.storage.flush()
+
+    for task_id, ok in zip(task_ids, found):
+        if ok:
+            print(_ansi("green", f"✅ Task #{task_id} marked as completed!"))
+        else:
+            print(_ansi("red", f"❌ Task #{task_id} not found."))
 
 
-@cli.command()
-@click.argument("task_id", type=int)
-def uncomplete(task_id):
+@command("uncomplete", "TASK_ID")
+def _uncomplete(argv):
     """Reopen a completed task."""
+    args = parse_args("uncomplete", argv, positional=("task_id",))
+    task_id = task_id_arg("uncomplete", args["task_id"])
+
     manager = get_manager()
     task = manager.uncomplete_task(task_id)
-    
+    manager.storage.flush()
+
     if task:
-        console.print(f"[yellow]⏳ Task #{task_id} reopened![/yellow]")
+        print(_ansi("yellow", f"⏳ Task #{task_id} reopened!"))
     else:
-        console.print(f"[red]❌ Task #{task_id} not found.[/red]")
+        print(_ansi("red", f"❌ Task #{task_id} not found."))
 
 
-@cli.command()
-@click.argument("task_id", type=int)
-@click.confirmation_option(prompt="Are you sure you want to delete this task?")
-def delete(task_id):
+@command("delete", "TASK_ID [--yes]")
+def _delete(argv):
     """Delete a task permanently."""
+    args = parse_args("delete", argv, positional=("task_id",),
+                      flags={"--yes": "yes", "-y": "yes"})
+    task_id = task_id_arg("delete", args["task_id"])
+    confirm("Are you sure you want to delete this task?", args["yes"])
+
     manager = get_manager()
-    if manager.delete_task(task_id):
-        console.print(f"[green]🗑️  Task #{task_id} deleted.[/green]")
+    deleted = manager.delete_task(task_id)
+    manager.storage.flush()
+
+    if deleted:
+        print(_ansi("green", f"🗑️  Task #{task_id} deleted."))
     else:
-        console.print(f"[red]❌ Task #{task_id} not found.[/red]")
+        print(_ansi("red", f"❌ Task #{task_id} not found."))
 
 
-@cli.command()
-@click.argument("task_id", type=int)
-@click.option("--title", "-t", help="New title")
-@click.option("--description", "-d", help="New description")
-@click.option("--priority", "-p", 
-              type=click.Choice(["high", "medium", "low"]),
-              help="New priority")
-def update(task_id, title, description, priority):
+@command("update", "TASK_ID [-t TITLE] [-d DESCRIPTION] [-p high|medium|low]")
+def _update(argv):
     """Update a task's details."""
+    args = parse_args("update", argv, positional=("task_id",), options={
+        "-t": "title", "--title": "title",
+        "-d": "description", "--description": "description",
+        "-p": "priority", "--priority": "priority",
+    })
+    task_id = task_id_arg("update", args["task_id"])
+    priority = choice("update", "--priority", args["priority"], PRIORITY_CHOICES)
+
     manager = get_manager()
-    task = manager.update_task(task_id, title, description, priority)
-    
+    task = manager.update_task(task_id, args["title"], args["description"], priority)
+    manager.storage.flush()
+
     if task:
-        console.print(f"[green]✏️  Task #{task_id} updated![/green]")
+        print(_ansi("green", f"✏️  Task #{task_id} updated!"))
     else:
-        console.print(f"[red]❌ Task #{task_id} not found.[/red]")
+        print(_ansi("red", f"❌ Task #{task_id} not found."))
 
 
-@cli.command()
-def stats():
+@command("stats")
+def _stats(argv):
     """Show task statistics."""
+    parse_args("stats", argv)
+
     manager = get_manager()
     stats = manager.get_stats()
-    
-    # Create stats display
-    total_text = Text()
-    total_text.append(f"Total Tasks: ", style="bold")
-    total_text.append(str(stats["total"]), style="cyan")
-    
-    completed_text = Text()
-    completed_text.append(f"Completed: ", style="bold")
-    completed_text.append(str(stats["completed"]), style="green")
-    
-    pending_text = Text()
-    pending_text.append(f"Pending: ", style="bold")
-    pending_text.append(str(stats["pending"]), style="yellow")
-    
+
+    from rich.console import Console
+    from rich.panel import Panel
+    console = Console()
     console.print(Panel(
         f"[bold cyan]📊 Task Statistics[/bold cyan]\n\n"
         f"Total Tasks: [bold]{stats['total']}[/bold]\n"
@@ -202,18 +418,26 @@ def stats():
     ))
 
 
-@cli.command(name="clear-completed")
-@click.confirmation_option(prompt="Delete all completed tasks?")
-def clear_completed():
+@command("clear-completed", "[--yes]")
+def _clear_completed(argv):
     """Remove all completed tasks."""
+    args = parse_args("clear-completed", argv, flags={"--yes": "yes", "-y": "yes"})
+    confirm("Delete all completed tasks?", args["yes"])
+
     manager = get_manager()
     count = manager.clear_completed()
-    console.print(f"[green]🧹 Cleared {count} completed task(s).[/green]")
+    manager.storage.flush()
+    print(_ansi("green", f"🧹 Cleared {count} completed task(s)."))
 
 
-@cli.command()
-def interactive():
+@command("interactive")
+def _interactive(argv):
     """Launch interactive mode (shows help)."""
+    parse_args("interactive", argv)
+
+    from rich.console import Console
+    from rich.panel import Panel
+    console = Console()
     console.print(Panel(
         "[bold cyan]Task Tracker CLI[/bold cyan]\n\n"
         "Quick commands:\n"
@@ -7,9 +7,12 @@ setup(
     author="Shukiclaw",
     packages=find_packages(),
     install_requires=[
-        "click>=8.0.0",
         "rich>=13.0.0",
     ],
+    extras_require={
+        "fast": ["orjson>=3.0"],
+        "stream": ["ijson>=3.1"],
+    },
     entry_points={
         "console_scripts": [
             "task-tracker=main:cli",
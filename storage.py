@@ -1,8 +1,144 @@
 """JSON persistence layer for task storage."""
+import atexit
+import codecs
 import json
+import mmap
 import os
+import queue
+import threading
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # optional C serializer, see extras_require["fast"]
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional streaming parser, see extras_require["stream"]
+    ijson = None
+
+# What a corrupt or truncated snapshot can raise; ijson's errors are not
+# ValueErrors
+_PARSE_ERRORS = (ValueError,) + ((ijson.JSONError,) if ijson is not None else ())
+
+
+class WriteError(Exception):
+    """A queued write failed on the writer thread; raised by flush()."""
+
+
+# Journal size after which TaskManager folds it back into the snapshot
+LOG_COMPACT_BYTES = 64 * 1024
+
+# Seconds a writer thread waits for more work before exiting
+WRITER_IDLE_SECONDS = 1.0
+
+# Snapshots smaller than this are read directly; mapping them costs more
+MMAP_MIN_BYTES = 4096
+
+# Without orjson, snapshots this large are streamed through ijson (when
+# installed) to bound peak memory; below it a plain read is faster
+STREAM_MIN_BYTES = 1024 * 1024
+
+
+def _dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def _loads(data: bytes) -> Any:
+    """Parse UTF-8 JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class _Writer:
+    """Background thread writing queued changes for one data file.
+    
+    Shared by every TaskStorage on that file so they never race each other.
+    Writers live in ``_WRITERS`` while their thread runs; the thread is
+    started on demand and, once the queue stays idle, exits and removes
+    the writer. Queue items are ``(storage, kind, payload)``.
+    """
+    
+    def __init__(self, key: str):
+        self.key = key
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(
+            target=self._run, name="task-storage-writer", daemon=True)
+    
+    @classmethod
+    def submit(cls, key: str, storage: "TaskStorage", kind: str, payload: Any) -> None:
+        """Queue a write on the writer for ``key``, starting one if needed."""
+        with _WRITERS_LOCK:
+            writer = _WRITERS.get(key)
+            if writer is None:
+                writer = _WRITERS[key] = cls(key)
+                writer.thread.start()
+            writer.queue.put((storage, kind, payload))
+    
+    def _run(self) -> None:
+        """Thread loop: write everything queued so far in one go."""
+        while True:
+            try:
+                batch = [self.queue.get(timeout=WRITER_IDLE_SECONDS)]
+            except queue.Empty:
+                with _WRITERS_LOCK:
+                    # submit() holds the lock while queueing, so nothing
+                    # can slip in between this check and the exit
+                    if self.queue.empty():
+                        del _WRITERS[self.key]
+                        return
+                continue
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+    
+    @staticmethod
+    def _write(batch: List[Tuple["TaskStorage", str, Any]]) -> None:
+        """Write one batch and notify (or fail) every storage in it."""
+        storages = list(dict.fromkeys(storage for storage, _, _ in batch))
+        try:
+            storages[0]._write_batch([(kind, payload) for _, kind, payload in batch])
+            for storage in storages:
+                storage._notify()
+        except Exception as e:
+            for storage in storages:
+                storage._error = e
+                if storage.write_failed is not None:
+                    storage.write_failed()
+
+
+# Absolute data file path -> its _Writer
+_WRITERS: Dict[str, _Writer] = {}
+_WRITERS_LOCK = threading.Lock()
+
+# Set at interpreter exit; writes are synchronous from then on
+_closing = False
+
+
+def _close_writers() -> None:
+    """Let queued writes land before the interpreter exits."""
+    global _closing
+    with _WRITERS_LOCK:
+        writers = list(_WRITERS.values())
+    for writer in writers:
+        writer.queue.join()
+    _closing = True
+
+
+atexit.register(_close_writers)
 
 
 class TaskStorage:
@@ -19,24 +155,256 @@ class TaskStorage:
             self.data_file = data_file
             self.data_dir = os.path.dirname(data_file)
         
+        # Append-only journal of changes made since the last full save
+        self.log_file = self.data_file + ".log"
+        
+        # Called after each write lands on disk (from the writer thread)
+        self.after_write: Optional[Callable[[], None]] = None
+        # Called when a background write fails (from the writer thread)
+        self.write_failed: Optional[Callable[[], None]] = None
+        
+        # Failed background write, re-raised by flush()
+        self._error = None
+        
         # Ensure directory exists
         os.makedirs(self.data_dir, exist_ok=True)
     
+    def _submit(self, kind: str, payload: Any) -> None:
+        """Queue a write for the background writer thread."""
+        if _closing:
+            # Interpreter is shutting down; writer threads may already be gone
+            self._write_batch([(kind, payload)])
+            self._notify()
+            return
+        _Writer.submit(os.path.abspath(self.data_file), self, kind, payload)
+    
+    def _notify(self) -> None:
+        """Run the after_write hook, if one is set."""
+        if self.after_write is not None:
+            self.after_write()
+    
+    def _write_batch(self, batch: List[Tuple[str, Any]]) -> None:
+        """Write queued snapshots and journal records, coalescing them.
+        
+        A snapshot already contains every change queued before it, so
+        only the latest snapshot and the records after it are written.
+        """
+        snapshot = None
+        records = []
+        for kind, payload in batch:
+            if kind == "snapshot":
+                snapshot = payload
+                records = []
+            else:
+                records.extend(payload)
+        if snapshot is not None:
+            self._write_snapshot(*snapshot)
+        if records:
+            self._write_records(records)
+    
+    def flush(self) -> None:
+        """Block until queued writes are on disk.
+        
+        Raises WriteError (chained to the original error) if one failed.
+        """
+        with _WRITERS_LOCK:
+            writer = _WRITERS.get(os.path.abspath(self.data_file))
+        if writer is not None:
+            writer.queue.join()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise WriteError(str(error)) from error
+    
     def load_tasks(self) -> List[Dict[str, Any]]:
-        """Load tasks from JSON file. Returns empty list if file doesn't exist."""
+        """Load tasks from JSON file and replay the journal on top of it."""
+        return self.load_state()["tasks"]
+    
+    def load_state(self) -> Dict[str, Any]:
+        """Load ``{"next_id": int, "tasks": [...]}`` with the journal replayed.
+        
+        ``next_id`` is persisted rather than derived from the surviving
+        tasks so IDs of deleted tasks are never handed out again.
+        """
+        self.flush()
+        snapshot = self._load_snapshot()
+        if isinstance(snapshot, list):
+            # Files written before the header existed are a bare task list
+            snapshot = {"tasks": snapshot}
+        tasks = snapshot.get("tasks") or []
+        next_id = snapshot.get("next_id") or self.get_next_id(tasks)
+        return self._replay_log(tasks, next_id, snapshot.get("log_consumed"))
+    
+    def _load_snapshot(self) -> Any:
+        """Load the last full save. Returns empty list if file doesn't exist."""
         if not os.path.exists(self.data_file):
             return []
         
         try:
-            with open(self.data_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (json.JSONDecodeError, IOError):
+            with open(self.data_file, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if orjson is not None:
+                    if size >= MMAP_MIN_BYTES:
+                        return self._map_snapshot(f)
+                elif ijson is not None and size >= STREAM_MIN_BYTES:
+                    return self._stream_snapshot(f)
+                return _loads(f.read())
+        except _PARSE_ERRORS + (IOError,):
             return []
     
-    def save_tasks(self, tasks: List[Dict[str, Any]]) -> None:
-        """Save tasks to JSON file."""
-        with open(self.data_file, 'w', encoding='utf-8') as f:
-            json.dump(tasks, f, indent=2, default=str)
+    @staticmethod
+    def _map_snapshot(f) -> Any:
+        """Parse a snapshot straight from a read-only memory map.
+        
+        Only used with orjson, which accepts a buffer; the stdlib json
+        module would need the mapping copied into bytes first, which is no
+        better than reading the file.
+        """
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with memoryview(mm) as view:
+                return orjson.loads(view)
+    
+    @staticmethod
+    def _stream_snapshot(f) -> Any:
+        """Parse a snapshot incrementally so the raw text is never held whole."""
+        # Look past a UTF-8 BOM and leading whitespace for the top-level type
+        start = len(codecs.BOM_UTF8) if f.read(3) == codecs.BOM_UTF8 else 0
+        f.seek(start)
+        head = f.read(1)
+        while head and head in b" \t\r\n":
+            head = f.read(1)
+        f.seek(start)
+        if head == b"[":
+            return list(ijson.items(f, 'item', use_float=True))
+        return dict(ijson.kvitems(f, '', use_float=True))
+    
+    def _replay_log(self, tasks: List[Dict[str, Any]], next_id: int,
+                    consumed: str = None) -> Dict[str, Any]:
+        """Apply journal records to a snapshot, preserving task order.
+        
+        ``consumed`` is the ID of the journal the snapshot already folded
+        in; a journal with that ID is stale, so it is removed rather than
+        replayed (left in place, later appends would land behind its header).
+        """
+        state = {"next_id": next_id, "tasks": tasks}
+        if not os.path.exists(self.log_file):
+            return state
+        
+        live = {task.get('id'): task for task in tasks}
+        stale = False
+        try:
+            with open(self.log_file, 'rb') as f:
+                for line in f:
+                    try:
+                        record = _loads(line)
+                    except ValueError:
+                        # Torn write from an interrupted append
+                        continue
+                    if 'log' in record:
+                        if consumed is not None and record['log'] == consumed:
+                            stale = True
+                            break
+                        continue
+                    task = record.get('task') or {}
+                    task_id = task.get('id')
+                    if record.get('op') == 'upsert':
+                        live[task_id] = task
+                        if isinstance(task_id, int) and task_id >= next_id:
+                            next_id = task_id + 1
+                    elif record.get('op') == 'delete':
+                        live.pop(task_id, None)
+        except IOError:
+            return state
+        if stale:
+            # We died between saving the snapshot and removing its journal
+            try:
+                os.remove(self.log_file)
+            except OSError:
+                pass
+            return state
+        return {"next_id": next_id, "tasks": list(live.values())}
+    
+    def append_record(self, op: str, task: Dict[str, Any]) -> None:
+        """Append one journal record.
+        
+        ``op`` is ``"upsert"`` with the full task, or ``"delete"`` with a
+        dict holding at least the task's ``id``.
+        """
+        self.append_records([(op, task)])
+    
+    def append_records(self, records: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Append several ``(op, task)`` journal records with a single write.
+        
+        The write happens on a background thread; see flush().
+        """
+        self._submit("records", list(records))
+    
+    def _write_records(self, records: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Append serialized journal records to the log file.
+        
+        A new journal starts with a ``{"log": <id>}`` header line that
+        snapshots use to mark it as folded in.
+        """
+        data = b"".join(_dumps({"op": op, "task": task}) + b"\n" for op, task in records)
+        with open(self.log_file, 'ab') as f:
+            if f.tell() == 0:
+                data = _dumps({"log": os.urandom(8).hex()}) + b"\n" + data
+            f.write(data)
+    
+    def _log_id(self) -> Optional[str]:
+        """ID from the current journal's header line, if it has one."""
+        try:
+            with open(self.log_file, 'rb') as f:
+                header = _loads(f.readline())
+        except (ValueError, IOError):
+            return None
+        return header.get('log') if isinstance(header, dict) else None
+    
+    def needs_compaction(self) -> bool:
+        """Whether the journal has grown past LOG_COMPACT_BYTES.
+        
+        Checks the file as written so far, so it may trail queued records.
+        """
+        try:
+            return os.path.getsize(self.log_file) > LOG_COMPACT_BYTES
+        except OSError:
+            return False
+    
+    def fingerprint(self) -> tuple:
+        """Identify the on-disk state by (mtime_ns, inode, size) of both files."""
+        stamp = []
+        for path in (self.data_file, self.log_file):
+            try:
+                st = os.stat(path)
+            except OSError:
+                stamp.append(None)
+            else:
+                stamp.append((st.st_mtime_ns, st.st_ino, st.st_size))
+        return tuple(stamp)
+    
+    def save_tasks(self, tasks: List[Dict[str, Any]], next_id: int = None) -> None:
+        """Save tasks to JSON file and discard the journal it supersedes.
+        
+        The write happens on a background thread; the task dicts must not
+        be mutated afterwards (TaskManager hands over fresh copies).
+        """
+        if next_id is None:
+            next_id = self.get_next_id(tasks)
+        self._submit("snapshot", (list(tasks), next_id))
+    
+    def _write_snapshot(self, tasks: List[Dict[str, Any]], next_id: int) -> None:
+        """Atomically replace tasks.json and drop the journal."""
+        data = _dumps({"next_id": next_id, "log_consumed": self._log_id(), "tasks": tasks})
+        tmp_file = self.data_file + ".tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file, self.data_file)
+        
+        # The journal is only removed once the new snapshot is in place. If
+        # we die in between, log_consumed tells load_state() to skip it:
+        # replaying it could resurrect tasks the snapshot dropped (e.g. by
+        # clear_completed, which journals no deletes).
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
     
     def get_next_id(self, tasks: List[Dict[str, Any]]) -> int:
         """Get the next available task ID."""
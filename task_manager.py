@@ -1,151 +1,352 @@
 """Core task management logic."""
-from datetime import datetime
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from itertools import filterfalse
+from operator import attrgetter
 from typing import List, Dict, Any, Optional
 from storage import TaskStorage
 
 
+# Priority name -> sort weight (higher sorts first), and the accepted names
+_PRI_CODE = {"high": 3, "medium": 2, "low": 1}
+_VALID_PRI = frozenset(_PRI_CODE)
+
+
+def _now_ms() -> int:
+    """Current time as integer milliseconds since the epoch."""
+    return int(time.time() * 1000)
+
+
+# Predicate for the status filters; a C callable, so filter() stays in C
+_is_completed = attrgetter("completed")
+
+# data_file -> (storage fingerprint, TaskManager), see get_manager()
+_MANAGER_CACHE = {}
+
+
+class Task:
+    """A single task record.
+    
+    Uses ``__slots__`` instead of a per-task dict; storage still deals in
+    plain dicts via ``to_dict``/``from_dict``. Keys this version does not
+    know are kept in ``extra`` and written back unchanged. Timestamps are
+    epoch milliseconds (files from older versions may hold ISO strings).
+    """
+    
+    FIELDS = ("id", "title", "description", "priority",
+              "completed", "created_at", "completed_at")
+    __slots__ = FIELDS + ("extra",)
+    
+    def __init__(self, id: int = 0, title: str = "", description: str = "",
+                 priority: str = "medium", completed: bool = False,
+                 created_at: int = None, completed_at: int = None):
+        """Initialize a task; defaults match a freshly added task."""
+        self.id = id
+        self.title = title
+        self.description = description
+        self.priority = priority
+        self.completed = completed
+        self.created_at = created_at
+        self.completed_at = completed_at
+        self.extra = None
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Task":
+        """Build a task from its stored dict, keeping unknown keys aside."""
+        fields = {k: data[k] for k in cls.FIELDS if k in data}
+        task = cls(**fields)
+        if len(fields) != len(data):
+            task.extra = {k: v for k, v in data.items() if k not in fields}
+        return task
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to the dict shape used on disk."""
+        data = {k: getattr(self, k) for k in self.FIELDS}
+        if self.extra:
+            data.update(self.extra)
+        return data
+    
+    def __repr__(self) -> str:
+        return f"Task(id={self.id!r}, title={self.title!r}, priority={self.priority!r})"
+
+
 class TaskManager:
     """Manages task operations and business logic."""
     
-    PRIORITIES = {"high": 3, "medium": 2, "low": 1}
+    PRIORITIES = _PRI_CODE
     
     def __init__(self, storage: TaskStorage = None):
         """Initialize with optional custom storage."""
         self.storage = storage or TaskStorage()
+        self.storage.after_write = self._sync_cache
+        self.storage.write_failed = self._drop_cache
         self._tasks = None
+        # Sort key of each task in _tasks, which is kept in list order
+        self._sort_keys = []
+        self._by_id = {}
+        self._next_id = 1
+        # (completed, priority) -> number of tasks in that state
+        self._counts = Counter()
+        # Writes deferred while inside batch()
+        self._batch_depth = 0
+        self._pending = []
+        self._dirty = False
+    
+    @staticmethod
+    def _state(task: Task) -> tuple:
+        """Key under which a task is counted in ``_counts``."""
+        return (bool(task.completed), task.priority)
+    
+    @staticmethod
+    def _sort_key(task: Task) -> tuple:
+        """List order: priority (high first), then ID."""
+        return (-_PRI_CODE.get(task.priority, 2), task.id)
+    
+    def _insert(self, task: Task) -> None:
+        """Insert a task into _tasks at its sorted position."""
+        key = self._sort_key(task)
+        pos = bisect_left(self._sort_keys, key)
+        self._sort_keys.insert(pos, key)
+        self._tasks.insert(pos, task)
+    
+    def _unlink(self, task: Task) -> None:
+        """Remove a task from _tasks using its sort key to find it."""
+        pos = bisect_left(self._sort_keys, self._sort_key(task))
+        del self._sort_keys[pos]
+        del self._tasks[pos]
+    
+    def _load(self) -> None:
+        """Load tasks from storage and build the ID index and counters."""
+        state = self.storage.load_state()
+        self._tasks = sorted(map(Task.from_dict, state["tasks"]), key=self._sort_key)
+        self._sort_keys = [self._sort_key(t) for t in self._tasks]
+        self._next_id = state["next_id"]
+        self._by_id = {t.id: t for t in self._tasks}
+        self._counts = Counter(map(self._state, self._tasks))
     
     @property
-    def tasks(self) -> List[Dict[str, Any]]:
+    def tasks(self) -> List[Task]:
         """Lazy load tasks from storage."""
         if self._tasks is None:
-            self._tasks = self.storage.load_tasks()
+            self._load()
         return self._tasks
     
     def _save(self) -> None:
-        """Persist current tasks to storage."""
-        self.storage.save_tasks(self._tasks)
+        """Persist current tasks to storage as a full snapshot."""
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self.storage.save_tasks([t.to_dict() for t in self._tasks], self._next_id)
+    
+    def _record(self, op: str, task: Dict[str, Any]) -> None:
+        """Journal a single change, compacting once the journal grows large."""
+        if self._batch_depth:
+            self._pending.append((op, task))
+            return
+        self.storage.append_record(op, task)
+        self._after_append()
+    
+    def _after_append(self) -> None:
+        """Compact the journal once it has grown large."""
+        if self.storage.needs_compaction():
+            self._save()
     
-    def add_task(self, title: str, priority: str = "medium", 
-                 description: str = "") -> Dict[str, Any]:
+    @contextmanager
+    def batch(self):
+        """Defer persistence so several changes are written together.
+        
+        Journal records collected inside the block are appended with one
+        write on exit; a snapshot requested inside it (e.g. by
+        clear_completed) replaces them. Batches may be nested.
+        """
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._flush()
+    
+    def _flush(self) -> None:
+        """Write whatever was deferred by batch()."""
+        pending, self._pending = self._pending, []
+        if self._dirty:
+            self._dirty = False
+            self._save()
+        elif pending:
+            self.storage.append_records(pending)
+            self._after_append()
+    
+    def _sync_cache(self) -> None:
+        """Re-stamp our get_manager() cache entry so our own writes keep it valid.
+        
+        Runs as the storage's after_write hook, right after each write.
+        """
+        cached = _MANAGER_CACHE.get(self.storage.data_file)
+        if cached is not None and cached[1] is self:
+            _MANAGER_CACHE[self.storage.data_file] = (self.storage.fingerprint(), self)
+    
+    def _drop_cache(self) -> None:
+        """Evict our get_manager() cache entry after a failed write.
+        
+        Our in-memory state no longer matches disk, but the failed write
+        left the fingerprint unchanged, so the entry would still look valid.
+        Runs as the storage's write_failed hook.
+        """
+        cached = _MANAGER_CACHE.get(self.storage.data_file)
+        if cached is not None and cached[1] is self:
+            _MANAGER_CACHE.pop(self.storage.data_file, None)
+    
+    def add_task(self, title: str, priority: str = "medium",
+                 description: str = "") -> Task:
         """Add a new task with given title and priority."""
         # Normalize priority
-        priority = priority.lower()
-        if priority not in self.PRIORITIES:
-            priority = "medium"
+        p = priority.lower()
+        priority = p if p in _VALID_PRI else "medium"
         
-        task = {
-            "id": self.storage.get_next_id(self.tasks),
-            "title": title,
-            "description": description,
-            "priority": priority,
-            "completed": False,
-            "created_at": datetime.now().isoformat(),
-            "completed_at": None,
-        }
+        if self._tasks is None:
+            self._load()
+        task_id = self._next_id
+        self._next_id += 1
+        
+        task = Task(
+            id=task_id,
+            title=title,
+            description=description,
+            priority=priority,
+            completed=False,
+            created_at=_now_ms(),
+            completed_at=None,
+        )
         
-        self.tasks.append(task)
-        self._save()
+        self._insert(task)
+        self._by_id[task_id] = task
+        self._counts[self._state(task)] += 1
+        self._record("upsert", task.to_dict())
         return task
     
-    def get_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+    def get_task(self, task_id: int) -> Optional[Task]:
         """Get a task by ID."""
-        for task in self.tasks:
-            if task.get("id") == task_id:
-                return task
-        return None
+        if self._tasks is None:
+            self._load()
+        return self._by_id.get(task_id)
     
-    def list_tasks(self, status: str = None, priority: str = None) -> List[Dict[str, Any]]:
+    def list_tasks(self, status: str = None, priority: str = None) -> List[Task]:
         """List tasks with optional filtering."""
-        result = self.tasks.copy()
+        pri = priority.lower() if priority else None
         
-        # Filter by status
+        # _tasks is already ordered by priority (high first), then by ID
+        result = self.tasks
         if status == "completed":
-            result = [t for t in result if t.get("completed")]
+            result = filter(_is_completed, result)
         elif status == "pending":
-            result = [t for t in result if not t.get("completed")]
-        
-        # Filter by priority
-        if priority and priority.lower() in self.PRIORITIES:
-            result = [t for t in result if t.get("priority") == priority.lower()]
-        
-        # Sort by priority (high first), then by ID
-        result.sort(key=lambda t: (
-            -self.PRIORITIES.get(t.get("priority", "medium"), 2),
-            t.get("id", 0)
-        ))
-        
-        return result
+            result = filterfalse(_is_completed, result)
+        if pri in _VALID_PRI:
+            result = (t for t in result if t.priority == pri)
+        return list(result)
     
-    def complete_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+    def complete_task(self, task_id: int) -> Optional[Task]:
         """Mark a task as completed."""
         task = self.get_task(task_id)
         if task:
-            task["completed"] = True
-            task["completed_at"] = datetime.now().isoformat()
-            self._save()
+            self._counts[self._state(task)] -= 1
+            task.completed = True
+            task.completed_at = _now_ms()
+            self._counts[self._state(task)] += 1
+            self._record("upsert", task.to_dict())
         return task
     
-    def uncomplete_task(self, task_id: int) -> Optional[Dict[str, Any]]:
+    def uncomplete_task(self, task_id: int) -> Optional[Task]:
         """Mark a task as not completed (reopen)."""
         task = self.get_task(task_id)
         if task:
-            task["completed"] = False
-            task["completed_at"] = None
-            self._save()
+            self._counts[self._state(task)] -= 1
+            task.completed = False
+            task.completed_at = None
+            self._counts[self._state(task)] += 1
+            self._record("upsert", task.to_dict())
         return task
     
     def delete_task(self, task_id: int) -> bool:
         """Delete a task by ID. Returns True if deleted."""
-        for i, task in enumerate(self.tasks):
-            if task.get("id") == task_id:
-                self.tasks.pop(i)
-                self._save()
-                return True
-        return False
-    
-    def update_task(self, task_id: int, title: str = None, 
-                    description: str = None, priority: str = None) -> Optional[Dict[str, Any]]:
+        task = self.get_task(task_id)
+        if task is None:
+            return False
+        del self._by_id[task_id]
+        self._counts[self._state(task)] -= 1
+        self._unlink(task)
+        self._record("delete", {"id": task_id})
+        return True
+    
+    def update_task(self, task_id: int, title: str = None,
+                    description: str = None, priority: str = None) -> Optional[Task]:
         """Update task fields."""
         task = self.get_task(task_id)
         if not task:
             return None
         
         if title is not None:
-            task["title"] = title
+            task.title = title
         if description is not None:
-            task["description"] = description
-        if priority is not None and priority.lower() in self.PRIORITIES:
-            task["priority"] = priority.lower()
+            task.description = description
+        p = priority.lower() if priority is not None else None
+        if p in _VALID_PRI:
+            self._counts[self._state(task)] -= 1
+            self._unlink(task)
+            task.priority = p
+            self._insert(task)
+            self._counts[self._state(task)] += 1
         
-        self._save()
+        self._record("upsert", task.to_dict())
         return task
     
     def get_stats(self) -> Dict[str, int]:
-        """Get task statistics."""
+        """Get task statistics from the per-state counters."""
         total = len(self.tasks)
-        completed = sum(1 for t in self.tasks if t.get("completed"))
-        pending = total - completed
-        
-        by_priority = {"high": 0, "medium": 0, "low": 0}
-        for task in self.tasks:
-            p = task.get("priority", "medium")
-            if p in by_priority and not task.get("completed"):
-                by_priority[p] += 1
+        counts = self._counts
+        completed = sum(n for (done, _), n in counts.items() if done)
         
         return {
             "total": total,
             "completed": completed,
-            "pending": pending,
-            "high_priority": by_priority["high"],
-            "medium_priority": by_priority["medium"],
-            "low_priority": by_priority["low"],
+            "pending": total - completed,
+            "high_priority": counts[(False, "high")],
+            "medium_priority": counts[(False, "medium")],
+            "low_priority": counts[(False, "low")],
         }
     
     def clear_completed(self) -> int:
         """Remove all completed tasks. Returns count removed."""
         original_count = len(self.tasks)
-        self._tasks = [t for t in self.tasks if not t.get("completed")]
+        self._tasks = list(filterfalse(_is_completed, self.tasks))
+        self._sort_keys = [self._sort_key(t) for t in self._tasks]
+        self._by_id = {t.id: t for t in self._tasks}
+        self._counts = Counter(map(self._state, self._tasks))
         removed = original_count - len(self._tasks)
         if removed > 0:
             self._save()
         return removed
+
+
+def get_manager(data_file: str = None) -> TaskManager:
+    """Get a TaskManager for ``data_file`` (default location if omitted).
+    
+    The loaded manager is reused by later calls in the same process for as
+    long as neither tasks.json nor its journal has changed on disk.
+    """
+    storage = TaskStorage(data_file)
+    cached = _MANAGER_CACHE.get(storage.data_file)
+    if cached is not None:
+        # Let our own queued writes land (and re-stamp) before comparing
+        cached[1].storage.flush()
+        cached = _MANAGER_CACHE[storage.data_file]
+    fingerprint = storage.fingerprint()
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+    
+    manager = TaskManager(storage)
+    manager._load()
+    _MANAGER_CACHE[storage.data_file] = (fingerprint, manager)
+    return manager